@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.express as px
 from io import BytesIO
 from fpdf import FPDF
+from grafo import VERSION_GRAFO, construir_grafo
 
 # ============================
 # Configuración de la Página
@@ -200,130 +201,183 @@ with tabs[1]:
     
     st.header("📊 Parámetros de la Inversión 📊")
     
-    # MONTO A INVERTIR
-    monto_total = st.number_input(
-        "Monto Total a Invertir (MXN) 💵",
-        min_value=1000.0, value=40000.0, step=500.0,
-        help="Ingresa el monto total que deseas invertir en CETES."
+    # Los parámetros guardan su valor en st.session_state bajo una clave fija
+    parametros_iniciales = {
+        "monto_total": 40000.0,
+        "VN_CETES": 10.0,
+        "dias": 28,
+        "tdd_percent": 9.2015,
+        "inflacion": 3.77,
+        "isr_percent": 5.0,
+        "dias_transcurridos": 14,
+        "tdd_actual_percent": 9.002000,
+    }
+    parametros_venta = ("dias_transcurridos", "tdd_actual_percent")
+    
+    # Solo se reescriben los valores cuyo widget no se muestra o se va a recrear:
+    # cambiar de modo mueve los widgets dentro o fuera del formulario (nueva
+    # identidad) y los de venta anticipada se ocultan al desmarcarla. Así no se
+    # pisan las ediciones pendientes del formulario.
+    cambio_de_modo = st.session_state.get("modo_aplicar", False) != st.session_state.get("modo_aplicar_previo", False)
+    st.session_state.modo_aplicar_previo = st.session_state.get("modo_aplicar", False)
+    for clave, valor in parametros_iniciales.items():
+        oculto = clave in parametros_venta and not st.session_state.get("venta_anticipada", False)
+        if clave not in st.session_state:
+            st.session_state[clave] = valor
+        elif cambio_de_modo or oculto:
+            st.session_state[clave] = st.session_state[clave]
+    
+    # Modo aplicar: los cambios se envían juntos y provocan una sola ejecución
+    modo_aplicar = st.checkbox(
+        "Aplicar cambios con botón ✅", key="modo_aplicar",
+        help="Agrupa las ediciones de los parámetros y recalcula solo al presionar 'Aplicar cambios'."
     )
     
-    # Precio Nominal del CETE (slider para seleccionar de 1 a 200)
-    VN_CETES = st.slider(
-        "Precio Nominal del CETE (MXN) 💲",
-        min_value=1.0, max_value=200.0, value=10.0, step=1.0,
-        help="Selecciona el valor nominal de cada CETE."
+    # Fuera del formulario para que los campos de venta aparezcan al marcarla
+    venta_anticipada = st.checkbox(
+        "Simular Venta Anticipada (Antes del Vencimiento) ⏳", key="venta_anticipada",
+        help="Activa esta opción para simular la venta del CETE antes de su vencimiento."
     )
     
-    # PLAZO
-    monto_cetes = monto_total
-    dias = st.slider(
-        "Plazo de Inversión (días) ⏱️",
-        min_value=28,
-        max_value=365,
-        value=28,  # Valor inicial
-        step=1,
-        help="Selecciona el plazo de tu inversión entre 28 y 365 días."
-    )
+    contenedor_parametros = st.form("parametros_cetes") if modo_aplicar else st.container()
     
-    # TASA DE DESCUENTO
-    tdd_percent = st.number_input(
-        "Tasa de Descuento (%) 📉",
-        min_value=0.1, max_value=15.0, value=9.2015, step=0.00000001, format="%.8f",
-        help="Ingresa la tasa anualizada de descuento para CETES con máxima precisión."
-    )
-    tdd = tdd_percent / 100.0
-    
-    # ISR E INFLACIÓN
-    st.subheader("🔹 Parámetros Fiscales y Económicos 🔹")
-    inflacion = st.number_input(
-        "Tasa de Inflación (%) 📈",
-        min_value=0.0, max_value=20.0, value=3.77, step=0.00000001, format="%.8f",
-        help="Ejemplo: 3.77% medido el 28/03/2025"
-    )
+    with contenedor_parametros:
+        # MONTO A INVERTIR
+        monto_total = st.number_input(
+            "Monto Total a Invertir (MXN) 💵",
+            min_value=1000.0, step=500.0, key="monto_total",
+            help="Ingresa el monto total que deseas invertir en CETES."
+        )
     
-    isr_percent = st.number_input(
-        "Tasa de ISR Aplicada (%) 💸",
-        min_value=0.0, max_value=16.0, value=5.0, step=0.00000001, format="%.8f",
-        help="Ingresa la tasa de retención del ISR que se aplicará sobre el rendimiento obtenido."
-    )
+        # Precio Nominal del CETE (slider para seleccionar de 1 a 200)
+        VN_CETES = st.slider(
+            "Precio Nominal del CETE (MXN) 💲",
+            min_value=1.0, max_value=200.0, step=1.0, key="VN_CETES",
+            help="Selecciona el valor nominal de cada CETE."
+        )
     
-    # --- Parámetros para Venta Anticipada ---
-    venta_anticipada = st.checkbox(
-        "Simular Venta Anticipada (Antes del Vencimiento) ⏳",
-        help="Activa esta opción para simular la venta del CETE antes de su vencimiento."
-    )
+        # PLAZO
+        monto_cetes = monto_total
+        dias = st.slider(
+            "Plazo de Inversión (días) ⏱️",
+            min_value=28,
+            max_value=365,
+            step=1,
+            key="dias",
+            help="Selecciona el plazo de tu inversión entre 28 y 365 días."
+        )
     
-    if venta_anticipada:
-        dias_transcurridos = st.number_input(
-            "Días Transcurridos (antes de la venta) 🕒",
-            min_value=1, max_value=dias-1, value=35, step=1,
-            help="Ingresa el número de días transcurridos antes de realizar la venta anticipada."
+        # TASA DE DESCUENTO
+        tdd_percent = st.number_input(
+            "Tasa de Descuento (%) 📉",
+            min_value=0.1, max_value=15.0, step=0.00000001, format="%.8f", key="tdd_percent",
+            help="Ingresa la tasa anualizada de descuento para CETES con máxima precisión."
+        )
+        tdd = tdd_percent / 100.0
+    
+        # ISR E INFLACIÓN
+        st.subheader("🔹 Parámetros Fiscales y Económicos 🔹")
+        inflacion = st.number_input(
+            "Tasa de Inflación (%) 📈",
+            min_value=0.0, max_value=20.0, step=0.00000001, format="%.8f", key="inflacion",
+            help="Ejemplo: 3.77% medido el 28/03/2025"
         )
-        dias_restantes = dias - dias_transcurridos
-        tdd_actual_percent = st.number_input(
-            "Tasa de CETES Actual para Venta (%) 🔄",
-            min_value=0.1, max_value=30.0, value=9.002000, step=0.00000001, format="%.8f",
-            help="Ingresa la tasa de descuento vigente para el CETE en el momento de la venta."
+    
+        isr_percent = st.number_input(
+            "Tasa de ISR Aplicada (%) 💸",
+            min_value=0.0, max_value=16.0, step=0.00000001, format="%.8f", key="isr_percent",
+            help="Ingresa la tasa de retención del ISR que se aplicará sobre el rendimiento obtenido."
+        )
+    
+        # --- Parámetros para Venta Anticipada ---
+        # Se valida contra el plazo después de enviar, ya que ambos pueden cambiar juntos
+        if venta_anticipada:
+            dias_transcurridos = st.number_input(
+                "Días Transcurridos (antes de la venta) 🕒",
+                min_value=1, max_value=364, step=1, key="dias_transcurridos",
+                help="Ingresa el número de días transcurridos antes de realizar la venta anticipada."
+            )
+            tdd_actual_percent = st.number_input(
+                "Tasa de CETES Actual para Venta (%) 🔄",
+                min_value=0.1, max_value=30.0, step=0.00000001, format="%.8f", key="tdd_actual_percent",
+                help="Ingresa la tasa de descuento vigente para el CETE en el momento de la venta."
+            )
+            tdd_actual = tdd_actual_percent / 100.0
+        else:
+            dias_transcurridos = None
+            tdd_actual = None
+        
+        if modo_aplicar:
+            st.form_submit_button("Aplicar cambios ✅")
+    
+    if venta_anticipada and dias_transcurridos >= dias:
+        st.error(
+            f"Los días transcurridos ({dias_transcurridos}) deben ser menores al plazo de inversión ({dias} días). "
+            "No se calcula la venta anticipada. ⚠️"
         )
-        tdd_actual = tdd_actual_percent / 100.0
-    else:
+        venta_anticipada = False
         dias_transcurridos = None
-        dias_restantes = None
         tdd_actual = None
     
     # --- CÁLCULOS DE RENDIMIENTOS, TASAS E INTERESES ---
     st.markdown("---")
     st.header("💰 Resultados de la Inversión 💰")
     
-    # Precio de compra calculado con la tasa de descuento original
-    precio_cetes = VN_CETES * (1 - (tdd / 360) * dias)
+    # La estructura del grafo se reconstruye en cada ejecución; solo los valores y
+    # conteos viven en la sesión, y se descartan si cambia la firma del grafo
+    grafo = construir_grafo()
+    firma_grafo = (VERSION_GRAFO, tuple(grafo.nodos))
+    if st.session_state.get("grafo_firma") != firma_grafo:
+        st.session_state.grafo_firma = firma_grafo
+        st.session_state.grafo_valores = {}
+        st.session_state.grafo_conteo = dict(grafo.conteo)
+    grafo.valores = st.session_state.grafo_valores
+    grafo.conteo = st.session_state.grafo_conteo
+    grafo.actualizar(
+        VN_CETES=VN_CETES, dias=dias, tdd=tdd, isr_percent=isr_percent, inflacion=inflacion,
+        monto_cetes=monto_cetes, dias_transcurridos=dias_transcurridos, tdd_actual=tdd_actual
+    )
     
-    # Número de títulos comprados (solo se adquieren títulos enteros)
-    titulos_cetes = math.floor(monto_cetes / precio_cetes)
-    inversion_cetes = titulos_cetes * precio_cetes
-    remanente_cetes = monto_cetes - inversion_cetes
+    precio_cetes = grafo["precio_cetes"]
+    titulos_cetes = grafo["titulos_cetes"]
+    inversion_cetes = grafo["inversion_cetes"]
+    remanente_cetes = grafo["remanente_cetes"]
     
-    # Interés Bruto del periodo completo
-    interes_bruto_cetes = titulos_cetes * (VN_CETES - precio_cetes)
-    isr_cetes = interes_bruto_cetes * (isr_percent / 100.0)
-    interes_neto_cetes = interes_bruto_cetes - isr_cetes
+    interes_bruto_cetes = grafo["interes_bruto_cetes"]
+    isr_cetes = grafo["isr_cetes"]
+    interes_neto_cetes = grafo["interes_neto_cetes"]
     
-    # Rendimientos del CETE (Periodo Completo)
-    rendimiento_nominal_cetes = ((VN_CETES / precio_cetes) - 1) * 100 if inversion_cetes > 0 else 0
-    rendimiento_neto_cetes = rendimiento_nominal_cetes * (1 - isr_percent / 100.0) if inversion_cetes > 0 else 0
-    rendimiento_real_cetes = ((1 + rendimiento_neto_cetes/100) / (1 + inflacion/100) - 1) * 100
+    rendimiento_nominal_cetes = grafo["rendimiento_nominal_cetes"]
+    rendimiento_neto_cetes = grafo["rendimiento_neto_cetes"]
+    rendimiento_real_cetes = grafo["rendimiento_real_cetes"]
     
-    # Rendimientos Anualizados
-    rendimiento_nominal_cetes_anual = ((1 + (rendimiento_nominal_cetes / 100)) ** (360 / dias) - 1) * 100 if inversion_cetes > 0 else 0
-    rendimiento_neto_cetes_anual = rendimiento_nominal_cetes_anual * (1 - isr_percent / 100.0) if inversion_cetes > 0 else 0
-    rendimiento_real_cetes_anual = ((1 + rendimiento_neto_cetes_anual/100) / (1 + inflacion/100) - 1) * 100
+    rendimiento_nominal_cetes_anual = grafo["rendimiento_nominal_cetes_anual"]
+    rendimiento_neto_cetes_anual = grafo["rendimiento_neto_cetes_anual"]
+    rendimiento_real_cetes_anual = grafo["rendimiento_real_cetes_anual"]
     
-    # Utilidades Totales
-    utilidad_bruta = monto_cetes + interes_bruto_cetes
-    principal = utilidad_bruta - isr_cetes
-    utilidad_neta = principal - monto_cetes
+    utilidad_bruta = grafo["utilidad_bruta"]
+    principal = grafo["principal"]
+    utilidad_neta = grafo["utilidad_neta"]
     
-    # --- Cálculos para Venta Anticipada ---
+    # --- Resultados para Venta Anticipada ---
     if venta_anticipada:
-        precio_venta_cetes = VN_CETES * (1 - (tdd_actual / 360) * dias_restantes)
-        ganancia_venta_cetes = precio_venta_cetes - precio_cetes
-        interes_bruto_cetes_anticipado = titulos_cetes * ganancia_venta_cetes
-        isr_cetes_anticipado = interes_bruto_cetes_anticipado * (isr_percent / 100.0)
-        interes_neto_cetes_anticipado = interes_bruto_cetes_anticipado - isr_cetes_anticipado
+        precio_venta_cetes = grafo["precio_venta_cetes"]
+        ganancia_venta_cetes = grafo["ganancia_venta_cetes"]
+        interes_bruto_cetes_anticipado = grafo["interes_bruto_cetes_anticipado"]
+        isr_cetes_anticipado = grafo["isr_cetes_anticipado"]
+        interes_neto_cetes_anticipado = grafo["interes_neto_cetes_anticipado"]
         
-        # Rendimiento del periodo en venta anticipada
-        tasa_rendimiento_venta_periodo = (ganancia_venta_cetes / precio_cetes) * 100
-        tasa_rendimiento_neta_periodo = tasa_rendimiento_venta_periodo * (1 - isr_percent / 100.0)
-        tasa_rendimiento_real_periodo = ((1 + tasa_rendimiento_neta_periodo/100) / (1 + inflacion/100) - 1) * 100
+        tasa_rendimiento_venta_periodo = grafo["tasa_rendimiento_venta_periodo"]
+        tasa_rendimiento_neta_periodo = grafo["tasa_rendimiento_neta_periodo"]
+        tasa_rendimiento_real_periodo = grafo["tasa_rendimiento_real_periodo"]
         
-        # Rendimiento anualizado en venta anticipada (usando días transcurridos)
-        tasa_rendimiento_venta = (ganancia_venta_cetes * 360 / (precio_cetes * dias_transcurridos)) * 100
-        tasa_rendimiento_neta = tasa_rendimiento_venta * (1 - isr_percent / 100.0)
-        tasa_rendimiento_real = ((1 + tasa_rendimiento_neta/100) / (1 + inflacion/100) - 1) * 100
+        tasa_rendimiento_venta = grafo["tasa_rendimiento_venta"]
+        tasa_rendimiento_neta = grafo["tasa_rendimiento_neta"]
+        tasa_rendimiento_real = grafo["tasa_rendimiento_real"]
         
-        utilidad_bruta_anticipado = monto_cetes + interes_bruto_cetes_anticipado
-        principal_anticipado = utilidad_bruta_anticipado - isr_cetes_anticipado
-        utilidad_neta_anticipado = principal_anticipado - monto_cetes
+        utilidad_bruta_anticipado = grafo["utilidad_bruta_anticipado"]
+        principal_anticipado = grafo["principal_anticipado"]
+        utilidad_neta_anticipado = grafo["utilidad_neta_anticipado"]
     
     # --- MOSTRAR RESULTADOS ---
     col1, col2, col3 = st.columns(3)
@@ -387,6 +441,14 @@ with tabs[1]:
             st.metric("Precio de Venta (Tasa Actual)", f"${precio_venta_cetes:,.8f} MXN", help="Precio calculado con la tasa de descuento actual.")
             st.metric("Ganancia por Venta", f"${ganancia_venta_cetes:,.8f} MXN", help="Diferencia entre el precio de venta y el de compra.")
     
+    with st.expander("🔧 Recálculos por Nodo"):
+        st.caption(f"Nodos recalculados en esta ejecución: {len(grafo.ultimos)} de {len(grafo.nodos)}")
+        st.dataframe(pd.DataFrame({
+            "Nodo": list(grafo.conteo.keys()),
+            "Recálculos": list(grafo.conteo.values()),
+            "Última Ejecución": ["✅" if n in grafo.ultimos else "" for n in grafo.conteo],
+        }), hide_index=True)
+    
     st.markdown("---")
 
 
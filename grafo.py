@@ -0,0 +1,124 @@
+import math
+
+# Incrementar al modificar las fórmulas de construir_grafo() para descartar
+# los valores guardados en sesiones abiertas
+VERSION_GRAFO = 1
+
+
+class GrafoDependencias:
+    """Grafo reactivo de cantidades derivadas.
+
+    Cada nodo declara de qué entradas u otros nodos depende; al actualizar las
+    entradas solo se recalculan los nodos alcanzables desde las que cambiaron, y
+    la propagación se detiene en los nodos cuyo valor no cambia. Si alguna
+    dependencia vale None, el nodo vale None sin contarse como recálculo (p. ej.
+    la venta anticipada desactivada).
+
+    `valores` y `conteo` pueden venir de fuera (p. ej. st.session_state) para
+    conservarlos entre ejecuciones mientras la estructura se reconstruye.
+    """
+
+    def __init__(self, valores=None, conteo=None):
+        self.valores = {} if valores is None else valores
+        self.conteo = {} if conteo is None else conteo  # nombre -> número de recálculos
+        self.nodos = {}         # nombre -> (funcion, dependencias), en orden topológico
+        self.dependientes = {}  # nombre -> nodos que lo usan directamente
+        self.ultimos = []       # nodos recalculados en la última actualización
+
+    def nodo(self, nombre, dependencias, funcion):
+        # Los nodos deben registrarse después de sus dependencias
+        self.nodos[nombre] = (funcion, dependencias)
+        self.conteo.setdefault(nombre, 0)
+        for dep in dependencias:
+            self.dependientes.setdefault(dep, []).append(nombre)
+
+    def actualizar(self, **entradas) -> list:
+        # Los valores nuevos se acumulan aparte y solo se guardan si todo el
+        # recálculo termina sin errores
+        nuevos = {n: v for n, v in entradas.items() if n not in self.valores or self.valores[n] != v}
+        sucios = set(n for n in self.nodos if n not in self.valores)
+        for nombre in nuevos:
+            sucios.update(self.dependientes.get(nombre, []))
+        recalculados = []
+        for nombre, (funcion, dependencias) in self.nodos.items():
+            if nombre not in sucios:
+                continue
+            args = [nuevos[dep] if dep in nuevos else self.valores[dep] for dep in dependencias]
+            if any(a is None for a in args):
+                valor = None
+            else:
+                valor = funcion(*args)
+                recalculados.append(nombre)
+            if nombre not in self.valores or self.valores[nombre] != valor:
+                nuevos[nombre] = valor
+                sucios.update(self.dependientes.get(nombre, []))
+        self.valores.update(nuevos)
+        for nombre in recalculados:
+            self.conteo[nombre] += 1
+        self.ultimos = recalculados
+        return recalculados
+
+    def __getitem__(self, nombre):
+        return self.valores[nombre]
+
+
+def construir_grafo(valores=None, conteo=None) -> GrafoDependencias:
+    g = GrafoDependencias(valores, conteo)
+    # Precio de compra y títulos
+    g.nodo("precio_cetes", ["VN_CETES", "tdd", "dias"], lambda vn, tdd, dias: vn * (1 - (tdd / 360) * dias))
+    g.nodo("titulos_cetes", ["monto_cetes", "precio_cetes"], lambda monto, precio: math.floor(monto / precio))
+    g.nodo("inversion_cetes", ["titulos_cetes", "precio_cetes"], lambda titulos, precio: titulos * precio)
+    g.nodo("remanente_cetes", ["monto_cetes", "inversion_cetes"], lambda monto, inversion: monto - inversion)
+    # Intereses del periodo completo
+    g.nodo("interes_bruto_cetes", ["titulos_cetes", "VN_CETES", "precio_cetes"],
+           lambda titulos, vn, precio: titulos * (vn - precio))
+    g.nodo("isr_cetes", ["interes_bruto_cetes", "isr_percent"], lambda bruto, isr: bruto * (isr / 100.0))
+    g.nodo("interes_neto_cetes", ["interes_bruto_cetes", "isr_cetes"], lambda bruto, isr: bruto - isr)
+    # Rendimientos del periodo
+    g.nodo("rendimiento_nominal_cetes", ["VN_CETES", "precio_cetes", "inversion_cetes"],
+           lambda vn, precio, inversion: ((vn / precio) - 1) * 100 if inversion > 0 else 0)
+    g.nodo("rendimiento_neto_cetes", ["rendimiento_nominal_cetes", "isr_percent", "inversion_cetes"],
+           lambda nominal, isr, inversion: nominal * (1 - isr / 100.0) if inversion > 0 else 0)
+    g.nodo("rendimiento_real_cetes", ["rendimiento_neto_cetes", "inflacion"],
+           lambda neto, inflacion: ((1 + neto/100) / (1 + inflacion/100) - 1) * 100)
+    # Rendimientos anualizados
+    g.nodo("rendimiento_nominal_cetes_anual", ["rendimiento_nominal_cetes", "dias", "inversion_cetes"],
+           lambda nominal, dias, inversion: ((1 + (nominal / 100)) ** (360 / dias) - 1) * 100 if inversion > 0 else 0)
+    g.nodo("rendimiento_neto_cetes_anual", ["rendimiento_nominal_cetes_anual", "isr_percent", "inversion_cetes"],
+           lambda nominal, isr, inversion: nominal * (1 - isr / 100.0) if inversion > 0 else 0)
+    g.nodo("rendimiento_real_cetes_anual", ["rendimiento_neto_cetes_anual", "inflacion"],
+           lambda neto, inflacion: ((1 + neto/100) / (1 + inflacion/100) - 1) * 100)
+    # Utilidades totales
+    g.nodo("utilidad_bruta", ["monto_cetes", "interes_bruto_cetes"], lambda monto, bruto: monto + bruto)
+    g.nodo("principal", ["utilidad_bruta", "isr_cetes"], lambda utilidad, isr: utilidad - isr)
+    g.nodo("utilidad_neta", ["principal", "monto_cetes"], lambda principal, monto: principal - monto)
+    # Venta anticipada (None si está desactivada)
+    g.nodo("dias_restantes", ["dias", "dias_transcurridos"], lambda dias, transcurridos: dias - transcurridos)
+    g.nodo("precio_venta_cetes", ["VN_CETES", "tdd_actual", "dias_restantes"],
+           lambda vn, tdd_actual, restantes: vn * (1 - (tdd_actual / 360) * restantes))
+    g.nodo("ganancia_venta_cetes", ["precio_venta_cetes", "precio_cetes"], lambda venta, compra: venta - compra)
+    g.nodo("interes_bruto_cetes_anticipado", ["titulos_cetes", "ganancia_venta_cetes"],
+           lambda titulos, ganancia: titulos * ganancia)
+    g.nodo("isr_cetes_anticipado", ["interes_bruto_cetes_anticipado", "isr_percent"],
+           lambda bruto, isr: bruto * (isr / 100.0))
+    g.nodo("interes_neto_cetes_anticipado", ["interes_bruto_cetes_anticipado", "isr_cetes_anticipado"],
+           lambda bruto, isr: bruto - isr)
+    g.nodo("tasa_rendimiento_venta_periodo", ["ganancia_venta_cetes", "precio_cetes"],
+           lambda ganancia, precio: (ganancia / precio) * 100)
+    g.nodo("tasa_rendimiento_neta_periodo", ["tasa_rendimiento_venta_periodo", "isr_percent"],
+           lambda tasa, isr: tasa * (1 - isr / 100.0))
+    g.nodo("tasa_rendimiento_real_periodo", ["tasa_rendimiento_neta_periodo", "inflacion"],
+           lambda neta, inflacion: ((1 + neta/100) / (1 + inflacion/100) - 1) * 100)
+    g.nodo("tasa_rendimiento_venta", ["ganancia_venta_cetes", "precio_cetes", "dias_transcurridos"],
+           lambda ganancia, precio, transcurridos: (ganancia * 360 / (precio * transcurridos)) * 100)
+    g.nodo("tasa_rendimiento_neta", ["tasa_rendimiento_venta", "isr_percent"],
+           lambda tasa, isr: tasa * (1 - isr / 100.0))
+    g.nodo("tasa_rendimiento_real", ["tasa_rendimiento_neta", "inflacion"],
+           lambda neta, inflacion: ((1 + neta/100) / (1 + inflacion/100) - 1) * 100)
+    g.nodo("utilidad_bruta_anticipado", ["monto_cetes", "interes_bruto_cetes_anticipado"],
+           lambda monto, bruto: monto + bruto)
+    g.nodo("principal_anticipado", ["utilidad_bruta_anticipado", "isr_cetes_anticipado"],
+           lambda utilidad, isr: utilidad - isr)
+    g.nodo("utilidad_neta_anticipado", ["principal_anticipado", "monto_cetes"],
+           lambda principal, monto: principal - monto)
+    return g
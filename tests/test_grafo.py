@@ -0,0 +1,132 @@
+import math
+
+import pytest
+
+from grafo import construir_grafo
+
+BASE = dict(
+    VN_CETES=10.0, dias=28, tdd=0.092015, isr_percent=5.0, inflacion=3.77,
+    monto_cetes=40000.0, dias_transcurridos=None, tdd_actual=None,
+)
+VENTA = dict(BASE, dias=91, dias_transcurridos=35, tdd_actual=0.09002)
+
+
+def formulas_originales(VN_CETES, dias, tdd, isr_percent, inflacion, monto_cetes, dias_transcurridos, tdd_actual):
+    precio_cetes = VN_CETES * (1 - (tdd / 360) * dias)
+    titulos_cetes = math.floor(monto_cetes / precio_cetes)
+    inversion_cetes = titulos_cetes * precio_cetes
+    interes_bruto_cetes = titulos_cetes * (VN_CETES - precio_cetes)
+    isr_cetes = interes_bruto_cetes * (isr_percent / 100.0)
+    rendimiento_nominal_cetes = ((VN_CETES / precio_cetes) - 1) * 100
+    rendimiento_neto_cetes = rendimiento_nominal_cetes * (1 - isr_percent / 100.0)
+    rendimiento_nominal_cetes_anual = ((1 + (rendimiento_nominal_cetes / 100)) ** (360 / dias) - 1) * 100
+    rendimiento_neto_cetes_anual = rendimiento_nominal_cetes_anual * (1 - isr_percent / 100.0)
+    utilidad_bruta = monto_cetes + interes_bruto_cetes
+    principal = utilidad_bruta - isr_cetes
+    esperado = {
+        "precio_cetes": precio_cetes,
+        "titulos_cetes": titulos_cetes,
+        "inversion_cetes": inversion_cetes,
+        "remanente_cetes": monto_cetes - inversion_cetes,
+        "interes_bruto_cetes": interes_bruto_cetes,
+        "isr_cetes": isr_cetes,
+        "interes_neto_cetes": interes_bruto_cetes - isr_cetes,
+        "rendimiento_nominal_cetes": rendimiento_nominal_cetes,
+        "rendimiento_neto_cetes": rendimiento_neto_cetes,
+        "rendimiento_real_cetes": ((1 + rendimiento_neto_cetes/100) / (1 + inflacion/100) - 1) * 100,
+        "rendimiento_nominal_cetes_anual": rendimiento_nominal_cetes_anual,
+        "rendimiento_neto_cetes_anual": rendimiento_neto_cetes_anual,
+        "rendimiento_real_cetes_anual": ((1 + rendimiento_neto_cetes_anual/100) / (1 + inflacion/100) - 1) * 100,
+        "utilidad_bruta": utilidad_bruta,
+        "principal": principal,
+        "utilidad_neta": principal - monto_cetes,
+    }
+    if dias_transcurridos is not None:
+        precio_venta_cetes = VN_CETES * (1 - (tdd_actual / 360) * (dias - dias_transcurridos))
+        ganancia_venta_cetes = precio_venta_cetes - precio_cetes
+        interes_bruto_cetes_anticipado = titulos_cetes * ganancia_venta_cetes
+        isr_cetes_anticipado = interes_bruto_cetes_anticipado * (isr_percent / 100.0)
+        tasa_rendimiento_venta_periodo = (ganancia_venta_cetes / precio_cetes) * 100
+        tasa_rendimiento_neta_periodo = tasa_rendimiento_venta_periodo * (1 - isr_percent / 100.0)
+        tasa_rendimiento_venta = (ganancia_venta_cetes * 360 / (precio_cetes * dias_transcurridos)) * 100
+        tasa_rendimiento_neta = tasa_rendimiento_venta * (1 - isr_percent / 100.0)
+        utilidad_bruta_anticipado = monto_cetes + interes_bruto_cetes_anticipado
+        principal_anticipado = utilidad_bruta_anticipado - isr_cetes_anticipado
+        esperado.update({
+            "precio_venta_cetes": precio_venta_cetes,
+            "ganancia_venta_cetes": ganancia_venta_cetes,
+            "interes_bruto_cetes_anticipado": interes_bruto_cetes_anticipado,
+            "isr_cetes_anticipado": isr_cetes_anticipado,
+            "interes_neto_cetes_anticipado": interes_bruto_cetes_anticipado - isr_cetes_anticipado,
+            "tasa_rendimiento_venta_periodo": tasa_rendimiento_venta_periodo,
+            "tasa_rendimiento_neta_periodo": tasa_rendimiento_neta_periodo,
+            "tasa_rendimiento_real_periodo": ((1 + tasa_rendimiento_neta_periodo/100) / (1 + inflacion/100) - 1) * 100,
+            "tasa_rendimiento_venta": tasa_rendimiento_venta,
+            "tasa_rendimiento_neta": tasa_rendimiento_neta,
+            "tasa_rendimiento_real": ((1 + tasa_rendimiento_neta/100) / (1 + inflacion/100) - 1) * 100,
+            "utilidad_bruta_anticipado": utilidad_bruta_anticipado,
+            "principal_anticipado": principal_anticipado,
+            "utilidad_neta_anticipado": principal_anticipado - monto_cetes,
+        })
+    return esperado
+
+
+@pytest.mark.parametrize("entradas", [BASE, VENTA, dict(VENTA, inflacion=4.5, isr_percent=0.0)])
+def test_valores_coinciden_con_formulas_originales(entradas):
+    grafo = construir_grafo()
+    grafo.actualizar(**entradas)
+    for nombre, valor in formulas_originales(**entradas).items():
+        assert grafo[nombre] == pytest.approx(valor), nombre
+
+
+def test_venta_desactivada_no_cuenta_nodos_en_none():
+    grafo = construir_grafo()
+    grafo.actualizar(**BASE)
+    assert grafo["tasa_rendimiento_real"] is None
+    assert grafo.conteo["tasa_rendimiento_real"] == 0
+
+
+@pytest.mark.parametrize("cambio, esperados", [
+    ({"inflacion": 4.0}, ["rendimiento_real_cetes", "rendimiento_real_cetes_anual"]),
+    ({"isr_percent": 10.0}, [
+        "isr_cetes", "interes_neto_cetes", "rendimiento_neto_cetes", "rendimiento_real_cetes",
+        "rendimiento_neto_cetes_anual", "rendimiento_real_cetes_anual", "principal", "utilidad_neta",
+    ]),
+    # El número de títulos no cambia, así que la propagación se detiene ahí
+    ({"monto_cetes": 40001.0}, ["titulos_cetes", "remanente_cetes", "utilidad_bruta", "principal", "utilidad_neta"]),
+])
+def test_solo_recalcula_nodos_afectados(cambio, esperados):
+    grafo = construir_grafo()
+    grafo.actualizar(**BASE)
+    assert grafo.actualizar(**dict(BASE, **cambio)) == esperados
+    assert grafo.actualizar(**dict(BASE, **cambio)) == []
+
+
+def test_inflacion_con_venta_anticipada():
+    grafo = construir_grafo()
+    grafo.actualizar(**VENTA)
+    assert grafo.actualizar(**dict(VENTA, inflacion=4.0)) == [
+        "rendimiento_real_cetes", "rendimiento_real_cetes_anual",
+        "tasa_rendimiento_real_periodo", "tasa_rendimiento_real",
+    ]
+
+
+def test_error_no_deja_valores_a_medias():
+    grafo = construir_grafo()
+    grafo.actualizar(**BASE)
+    antes = dict(grafo.valores)
+    with pytest.raises(ZeroDivisionError):
+        grafo.actualizar(**dict(BASE, tdd=360 / 28))  # precio de compra igual a cero
+    assert grafo.valores == antes
+    # Un recálculo posterior con las mismas entradas vuelve a intentarlo
+    with pytest.raises(ZeroDivisionError):
+        grafo.actualizar(**dict(BASE, tdd=360 / 28))
+
+
+def test_valores_y_conteo_persisten_al_reconstruir():
+    valores, conteo = {}, {}
+    construir_grafo(valores, conteo).actualizar(**BASE)
+    grafo = construir_grafo(valores, conteo)
+    assert grafo.actualizar(**dict(BASE, inflacion=4.0)) == ["rendimiento_real_cetes", "rendimiento_real_cetes_anual"]
+    assert conteo["rendimiento_real_cetes"] == 2
+    assert conteo["precio_cetes"] == 1